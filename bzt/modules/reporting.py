@@ -18,11 +18,15 @@ limitations under the License.
 import copy
 import csv
 import locale
+import logging
 import os
 import sys
 import time
 from collections import Counter, OrderedDict
-from datetime import datetime
+from contextlib import contextmanager, ExitStack
+from datetime import timedelta
+from itertools import chain
+from operator import itemgetter
 
 from terminaltables import AsciiTable
 
@@ -32,7 +36,7 @@ from bzt.modules.aggregator import DataPoint, KPISet, AggregatorListener, Result
 from bzt.modules.blazemeter import BlazeMeterUploader, CloudProvisioning
 from bzt.modules.functional import FunctionalAggregatorListener
 from bzt.modules.passfail import PassFailStatus
-from bzt.six import etree, iteritems, string_types, integer_types
+from bzt.six import etree, string_types, integer_types
 from bzt.utils import get_full_path, is_windows
 
 if is_windows():
@@ -92,33 +96,37 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         Log basic stats
         """
         super(FinalStatus, self).post_process()
+        params = self.parameters
 
-        if self.parameters.get("test-duration", True):
+        if params.get("test-duration", True):
             self.__report_duration()
 
         if self.last_sec:
-            summary_kpi = self.last_sec[DataPoint.CUMULATIVE][""]
+            cumulative = self.last_sec[DataPoint.CUMULATIVE]
+            summary_kpi = cumulative[""]
 
-            if self.parameters.get("summary", True):
+            if params.get("summary", True):
                 self.__report_samples_count(summary_kpi)
-            if self.parameters.get("percentiles", True):
+            if params.get("percentiles", True):
                 self.__report_percentiles(summary_kpi)
 
-            if self.parameters.get("summary-labels", True):
-                self.__report_summary_labels(self.last_sec[DataPoint.CUMULATIVE])
+            if params.get("summary-labels", True):
+                self.__report_summary_labels(cumulative)
 
-            if self.parameters.get("failed-labels"):
-                self.__report_failed_labels(self.last_sec[DataPoint.CUMULATIVE])
+            if params.get("failed-labels"):
+                self.__report_failed_labels(cumulative)
 
-            if self.parameters.get("dump-xml"):
-                self.__dump_xml(self.parameters.get("dump-xml"))
+            dump_xml = params.get("dump-xml")
+            if dump_xml:
+                self.__dump_xml(dump_xml)
 
-            if self.parameters.get("dump-csv"):
-                self.__dump_csv(self.parameters.get("dump-csv"))
+            dump_csv = params.get("dump-csv")
+            if dump_csv:
+                self.__dump_csv(dump_csv)
         elif self.cumulative_results:
             self.__report_summary()
 
-            report_mode = self.parameters.get("report-tests", "failed")
+            report_mode = params.get("report-tests", "failed")
             if report_mode == "failed":
                 self.__report_failed_tests()
             else:
@@ -128,11 +136,10 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         return noun + 's' if count > 1 else noun
 
     def __report_all_tests(self):
+        print_trace = self.parameters.get("print-stacktrace", True)
         for test_suite in self.cumulative_results.test_suites():
             for case in self.cumulative_results.test_cases(test_suite):
-                full_name = case.test_suite + "." + case.test_case
-                self.log.info("Test %s - %s", full_name, case.status)
-                print_trace = self.parameters.get("print-stacktrace", True)
+                self.log.info("Test %s.%s - %s", case.test_suite, case.test_case, case.status)
                 if print_trace and case.error_trace:
                     self.log.info("Stacktrace:\n%s", case.error_trace)
 
@@ -140,20 +147,19 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         for test_suite in self.cumulative_results.test_suites():
             for case in self.cumulative_results.test_cases(test_suite):
                 if case.status in ("FAILED", "BROKEN"):
-                    full_name = case.test_suite + "." + case.test_case
-                    msg = "Test {test_case} failed: {error_msg}".format(test_case=full_name, error_msg=case.error_msg)
                     if case.error_trace:
-                        msg += "\n" + case.error_trace
-                    self.log.warning(msg)
+                        self.log.warning("Test %s.%s failed: %s\n%s",
+                                         case.test_suite, case.test_case, case.error_msg, case.error_trace)
+                    else:
+                        self.log.warning("Test %s.%s failed: %s", case.test_suite, case.test_case, case.error_msg)
 
     def __report_summary(self):
-        status_counter = Counter()
-        for test_suite in self.cumulative_results.test_suites():
-            for case in self.cumulative_results.test_cases(test_suite):
-                status_counter[case.status] += 1
+        status_counter = Counter(case.status
+                                 for test_suite in self.cumulative_results.test_suites()
+                                 for case in self.cumulative_results.test_cases(test_suite))
 
         # FIXME: it's actually not tests, but test cases
-        total = sum(count for _, count in iteritems(status_counter))
+        total = sum(status_counter.values())
         self.log.info("Total: %s %s", total, self.__plural(total, 'test'))
 
     def __report_samples_count(self, summary_kpi_set):
@@ -168,14 +174,15 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         """
         reports percentiles
         """
+        if not self.log.isEnabledFor(logging.INFO):
+            return
+
         fmt = "Average times: total %.3f, latency %.3f, connect %.3f"
         self.log.info(fmt, summary_kpi_set[KPISet.AVG_RESP_TIME], summary_kpi_set[KPISet.AVG_LATENCY],
                       summary_kpi_set[KPISet.AVG_CONN_TIME])
 
         data = [("Percentile, %", "Resp. Time, s")]
-        for key in sorted(summary_kpi_set[KPISet.PERCENTILES].keys(), key=float):
-            data.append((float(key), summary_kpi_set[KPISet.PERCENTILES][key]))
-            # self.log.info("Percentile %.1f%%: %.3f", )
+        data.extend(sorted((float(level), val) for level, val in summary_kpi_set[KPISet.PERCENTILES].items()))
         table = SingleTable(data) if sys.stdout.isatty() else AsciiTable(data)
         table.justify_columns[0] = 'right'
         table.justify_columns[1] = 'right'
@@ -185,13 +192,14 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         """
         reports failed labels
         """
+        if not self.log.isEnabledFor(logging.INFO):
+            return
+
         report_template = "%d failed samples: %s"
-        sorted_labels = sorted(cumulative.keys())
-        for sample_label in sorted_labels:
-            if sample_label != "":
-                failed_samples_count = cumulative[sample_label]['fail']
-                if failed_samples_count:
-                    self.log.info(report_template, failed_samples_count, sample_label)
+        for sample_label in sorted(label for label in cumulative if label):
+            failed_samples_count = cumulative[sample_label]['fail']
+            if failed_samples_count:
+                self.log.info(report_template, failed_samples_count, sample_label)
 
     def __console_safe_encode(self, text):
         return text.encode(locale.getpreferredencoding(), errors='replace').decode('unicode_escape')
@@ -210,12 +218,15 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         return (
             self.__console_safe_encode(label_name),
             "FAIL" if failed_samples_count > 0 else "OK",
-            "{0:.2f}%".format(round(success_samples_perc, 2)),
-            "{0:.3f}".format(round(sample['avg_rt'], 3)),
+            "%.2f%%" % round(success_samples_perc, 2),
+            "%.3f" % round(sample['avg_rt'], 3),
             "\n".join(errors)
         )
 
     def __report_summary_labels(self, cumulative):
+        if not self.log.isEnabledFor(logging.INFO):
+            return
+
         data = [("label", "status", "succ", "avg_rt", "error")]
         justify = {0: "left", 1: "center", 2: "right", 3: "right", 4: "left"}
 
@@ -231,27 +242,23 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         """
         asks executors start_time and end_time, provides time delta
         """
-        date_start = datetime.fromtimestamp(int(self.start_time))
-        date_end = datetime.fromtimestamp(int(self.end_time))
-        self.log.info("Test duration: %s", date_end - date_start)
+        self.log.info("Test duration: %s", timedelta(seconds=int(self.end_time - self.start_time)))
 
     def __dump_xml(self, filename):
         self.log.info("Dumping final status as XML: %s", filename)
         root = etree.Element("FinalStatus")
 
         if self.first_ts < float("inf") and self.last_ts > 0:
-            duration_elem = etree.Element("TestDuration")
+            duration_elem = etree.SubElement(root, "TestDuration")
             duration_elem.text = str(round(float(self.last_ts - self.first_ts), 3))
-            root.append(duration_elem)
 
         report_info = get_bza_report_info(self.engine, self.log)
         if report_info:
             link, _ = report_info[0]
-            report_element = etree.Element("ReportURL")
+            report_element = etree.SubElement(root, "ReportURL")
             report_element.text = link
-            root.append(report_element)
         if self.last_sec:
-            for label, kpiset in iteritems(self.last_sec[DataPoint.CUMULATIVE]):
+            for label, kpiset in self.last_sec[DataPoint.CUMULATIVE].items():
                 root.append(self.__get_xml_summary(label, kpiset))
 
         with open(get_full_path(filename), 'wb') as fhd:
@@ -260,12 +267,12 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
 
     def __get_xml_summary(self, label, kpiset):
         elem = etree.Element("Group", label=label)
-        for kpi_name, kpi_val in iteritems(kpiset):
+        for kpi_name, kpi_val in kpiset.items():
             if kpi_name in (KPISet.ERRORS, KPISet.RESP_TIMES):
                 continue
 
             if isinstance(kpi_val, dict):
-                for param_name, param_val in iteritems(kpi_val):
+                for param_name, param_val in kpi_val.items():
                     elem.append(self.__get_kpi_xml(kpi_name, param_val, param_name))
             else:
                 elem.append(self.__get_kpi_xml(kpi_name, kpi_val))
@@ -275,17 +282,14 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
     def __get_kpi_xml(self, kpi_name, kpi_val, param=None):
         kpi = etree.Element(kpi_name)
         kpi.attrib['value'] = self.__val_to_str(kpi_val)
-        elm_name = etree.Element("name")
+        elm_name = etree.SubElement(kpi, "name")
         elm_name.text = kpi_name
         if param is not None:
             kpi.attrib['param'] = self.__val_to_str(param)
             elm_name.text += "/" + param
 
-        kpi.append(elm_name)
-
-        elm_value = etree.Element("value")
+        elm_value = etree.SubElement(kpi, "value")
         elm_value.text = self.__val_to_str(kpi_val)
-        kpi.append(elm_value)
 
         return kpi
 
@@ -306,7 +310,7 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
             fieldnames = self.__get_csv_dict('', self.last_sec[DataPoint.CUMULATIVE]['']).keys()
             writer = csv.DictWriter(fhd, fieldnames)
             writer.writeheader()
-            for label, kpiset in iteritems(self.last_sec[DataPoint.CUMULATIVE]):
+            for label, kpiset in self.last_sec[DataPoint.CUMULATIVE].items():
                 writer.writerow(self.__get_csv_dict(label, kpiset))
 
     def __get_csv_dict(self, label, kpiset):
@@ -323,11 +327,11 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
         del res[KPISet.RESP_CODES]
         del res[KPISet.PERCENTILES]
 
-        percentiles = list(iteritems(kpiset[KPISet.PERCENTILES]))
+        percentiles = list(kpiset[KPISet.PERCENTILES].items())
         for level, val in sorted(percentiles, key=lambda lv: (float(lv[0]), lv[1])):
             res['perc_%s' % level] = val
 
-        resp_codes = list(iteritems(kpiset[KPISet.RESP_CODES]))
+        resp_codes = list(kpiset[KPISet.RESP_CODES].items())
         for rcd, val in sorted(resp_codes):
             res['rc_%s' % rcd] = val
 
@@ -341,13 +345,22 @@ class FinalStatus(Reporter, AggregatorListener, FunctionalAggregatorListener):
 class JUnitXMLReporter(Reporter, AggregatorListener, FunctionalAggregatorListener):
     """
     A reporter that exports results in Jenkins JUnit XML format.
+    Indentation of report is off unless `pretty-print` option is set.
     """
+    # pass/fail test case names by presence of (label, timeframe) in criterion config
+    CRITERION_NAME_TPL = {
+        (True, True): "%(subject)s of %(label)s%(condition)s%(threshold)s for %(timeframe)s",
+        (True, False): "%(subject)s of %(label)s%(condition)s%(threshold)s",
+        (False, True): "%(subject)s%(condition)s%(threshold)s for %(timeframe)s",
+        (False, False): "%(subject)s%(condition)s%(threshold)s",
+    }
 
     def __init__(self):
         super(JUnitXMLReporter, self).__init__()
         self.last_second = None
         self.report_file_path = None
         self.cumulative_results = None
+        self.pass_fail_objects = []
 
     def prepare(self):
         if isinstance(self.engine.aggregator, ResultsProvider):
@@ -355,6 +368,9 @@ class JUnitXMLReporter(Reporter, AggregatorListener, FunctionalAggregatorListene
         elif self.engine.is_functional_mode():
             self.engine.aggregator.add_listener(self)
 
+        mods = self.engine.reporters + self.engine.services  # TODO: remove it after passfail is only reporter
+        self.pass_fail_objects = [_x for _x in mods if isinstance(_x, PassFailStatus)]
+
     def aggregated_second(self, data):
         self.last_second = data
 
@@ -377,22 +393,22 @@ class JUnitXMLReporter(Reporter, AggregatorListener, FunctionalAggregatorListene
             test_data_source = self.parameters.get("data-source", "sample-labels")
 
             if test_data_source == "sample-labels":
-                if not self.last_second:
+                if not self.last_second or not self.last_second[DataPoint.CUMULATIVE]:
                     self.log.warning("No last second data to generate XUnit.xml")
+                    processor = None
                 else:
-                    writer = XUnitFileWriter(self.engine)
-                    self.process_sample_labels(writer)
-                    writer.save_report(filename)
+                    processor = self.process_sample_labels
             elif test_data_source == "pass-fail":
-                writer = XUnitFileWriter(self.engine)
-                self.process_pass_fail(writer)
-                writer.save_report(filename)
+                processor = self.process_pass_fail
             else:
                 raise TaurusConfigError("Unsupported data source: %s" % test_data_source)
         else:
-            writer = XUnitFileWriter(self.engine)
-            self.process_functional(writer)
-            writer.save_report(filename)
+            processor = self.process_functional
+
+        if processor:
+            writer = XUnitFileWriter(self.engine, pretty_print=self.parameters.get("pretty-print", False))
+            with writer.write_report(filename):
+                processor(writer)
 
         self.report_file_path = filename  # TODO: just for backward compatibility, remove later
 
@@ -403,94 +419,67 @@ class JUnitXMLReporter(Reporter, AggregatorListener, FunctionalAggregatorListene
         xunit.report_test_suite('sample_labels')
         labels = self.last_second[DataPoint.CUMULATIVE]
 
-        for key in sorted(labels.keys()):
-            if key == "":  # skip total label
-                continue
-
-            errors = []
-            for er_dict in labels[key][KPISet.ERRORS]:
-                rc = str(er_dict["rc"])
-                msg = str(er_dict["msg"])
-                cnt = str(er_dict["cnt"])
-                if er_dict["type"] == KPISet.ERRTYPE_ASSERT:
-                    err_element = etree.Element("failure", message=msg, type="Assertion Failure")
-                else:
-                    err_element = etree.Element("error", message=msg, type="Error")
-                err_desc = "%s\n(status code is %s)\n(total errors of this type: %s)" % (msg, rc, cnt)
-                err_element.text = err_desc
-                errors.append(err_element)
-
-            xunit.report_test_case('sample_labels', key, errors)
+        err_tpl = "%s\n(status code is %s)\n(total errors of this type: %s)"
+        get_err_fields = itemgetter("msg", "rc", "cnt", "type")
+        for key in sorted(label for label in labels if label):  # skip total label
+            with xunit.report_test_case(key) as test_case:
+                for er_dict in labels[key][KPISet.ERRORS]:
+                    msg, rc, cnt, err_type = get_err_fields(er_dict)
+                    msg = str(msg)
+                    if err_type == KPISet.ERRTYPE_ASSERT:
+                        err_element = etree.SubElement(test_case, "failure", message=msg, type="Assertion Failure")
+                    else:
+                        err_element = etree.SubElement(test_case, "error", message=msg, type="Error")
+                    err_element.text = err_tpl % (msg, rc, cnt)
 
     def process_pass_fail(self, xunit):
         """
         :type xunit: XUnitFileWriter
         """
         xunit.report_test_suite('bzt_pass_fail')
-        mods = self.engine.reporters + self.engine.services  # TODO: remove it after passfail is only reporter
-        pass_fail_objects = [_x for _x in mods if isinstance(_x, PassFailStatus)]
-        self.log.debug("Processing passfail objects: %s", pass_fail_objects)
-        fail_criteria = []
-        for pf_obj in pass_fail_objects:
-            if pf_obj.criteria:
-                for _fc in pf_obj.criteria:
-                    fail_criteria.append(_fc)
+        self.log.debug("Processing passfail objects: %s", self.pass_fail_objects)
+        fail_criteria = chain.from_iterable(pf_obj.criteria for pf_obj in self.pass_fail_objects)
 
         for fc_obj in fail_criteria:
-            if 'label' in fc_obj.config:
-                data = (fc_obj.config['subject'], fc_obj.config['label'], fc_obj.config['condition'],
-                        fc_obj.config['threshold'])
-                tpl = "%s of %s%s%s"
-            else:
-                data = (fc_obj.config['subject'], fc_obj.config['condition'], fc_obj.config['threshold'])
-                tpl = "%s%s%s"
-            if fc_obj.config['timeframe']:
-                tpl += " for %s"
-                data += (fc_obj.config['timeframe'],)
-            disp_name = tpl % data
-
-            if fc_obj.is_triggered and fc_obj.fail:
-                errors = [etree.Element("error", message=str(fc_obj), type="pass/fail criteria triggered")]
-            else:
-                errors = ()
+            tpl = self.CRITERION_NAME_TPL['label' in fc_obj.config, bool(fc_obj.config['timeframe'])]
+            disp_name = tpl % fc_obj.config
 
-            xunit.report_test_case('bzt_pass_fail', disp_name, errors)
+            with xunit.report_test_case(disp_name) as test_case:
+                if fc_obj.is_triggered and fc_obj.fail:
+                    etree.SubElement(test_case, "error", message=str(fc_obj), type="pass/fail criteria triggered")
 
     def process_functional(self, xunit):
-        for suite_name, samples in iteritems(self.cumulative_results):
+        for suite_name, samples in self.cumulative_results.items():
             duration = max(s.start_time for s in samples) - min(s.start_time for s in samples)
             duration += max(samples, key=lambda s: s.start_time).duration
+            statuses = Counter(sample.status for sample in samples)
             attrs = {
                 "name": suite_name,
                 "tests": str(len(samples)),
-                "errors": str(len([sample for sample in samples if sample.status == "BROKEN"])),
-                "skipped": str(len([sample for sample in samples if sample.status == "SKIPPED"])),
-                "failures": str(len([sample for sample in samples if sample.status == "FAILED"])),
+                "errors": str(statuses["BROKEN"]),
+                "skipped": str(statuses["SKIPPED"]),
+                "failures": str(statuses["FAILED"]),
                 "time": str(round(duration, 3)),
                 # TODO: "timestamp" attribute
             }
-            xunit.add_test_suite(suite_name, attributes=attrs)
+            xunit.add_test_suite(attributes=attrs)
             for sample in samples:
                 attrs = {
                     "classname": sample.test_suite,
                     "name": sample.test_case,
                     "time": str(round(sample.duration, 3))
                 }
-                children = []
-                if sample.status == "BROKEN":
-                    error = etree.Element("error", type=sample.error_msg)
-                    if sample.error_trace:
-                        error.text = sample.error_trace
-                    children.append(error)
-                elif sample.status == "FAILED":
-                    failure = etree.Element("failure", message=sample.error_msg)
-                    if sample.error_trace:
-                        failure.text = sample.error_trace
-                    children.append(failure)
-                elif sample.status == "SKIPPED":
-                    skipped = etree.Element("skipped")
-                    children.append(skipped)
-                xunit.add_test_case(suite_name, attributes=attrs, children=children)
+                with xunit.add_test_case(attributes=attrs) as test_case:
+                    if sample.status == "BROKEN":
+                        error = etree.SubElement(test_case, "error", type=sample.error_msg)
+                        if sample.error_trace:
+                            error.text = sample.error_trace
+                    elif sample.status == "FAILED":
+                        failure = etree.SubElement(test_case, "failure", message=sample.error_msg)
+                        if sample.error_trace:
+                            failure.text = sample.error_trace
+                    elif sample.status == "SKIPPED":
+                        etree.SubElement(test_case, "skipped")
 
 
 def get_bza_report_info(engine, log):
@@ -504,9 +493,8 @@ def get_bza_report_info(engine, log):
         report_url = cloud_prov.results_url
         result.append((report_url, test_name if test_name else report_url))
     else:
-        bza_reporters = [_x for _x in engine.reporters if isinstance(_x, BlazeMeterUploader)]
-        for bza_reporter in bza_reporters:
-            if bza_reporter.results_url:
+        for bza_reporter in engine.reporters:
+            if isinstance(bza_reporter, BlazeMeterUploader) and bza_reporter.results_url:
                 test_name = bza_reporter.parameters.get("test")
                 report_url = bza_reporter.results_url
                 result.append((report_url, test_name if test_name else report_url))
@@ -517,81 +505,116 @@ def get_bza_report_info(engine, log):
 
 
 class XUnitFileWriter(object):
+    """
+    Streams JUnit XML into file while test cases are reported,
+    so the whole document never has to be kept in memory.
+    """
     REPORT_FILE_NAME = "xunit"
     REPORT_FILE_EXT = ".xml"
 
-    def __init__(self, engine):
+    def __init__(self, engine, pretty_print=False):
         """
         :type engine: bzt.engine.Engine
+        :type pretty_print: bool
         """
         super(XUnitFileWriter, self).__init__()
         self.engine = engine
+        self.pretty_print = pretty_print
         self.log = engine.log.getChild(self.__class__.__name__)
-        self.test_suites = OrderedDict()
+        self.xml_file = None
+        self.suite = ExitStack()
+        self.suite_is_empty = True
         bza_report_info = get_bza_report_info(engine, self.log)
         self.class_name = bza_report_info[0][1] if bza_report_info else "bzt-" + str(self.__hash__())
-        self.report_urls = ["BlazeMeter report link: %s\n" % info_item[0] for info_item in bza_report_info]
+        self.system_out = "".join("BlazeMeter report link: %s\n" % info_item[0] for info_item in bza_report_info)
 
-    def save_report(self, fname):
+    @contextmanager
+    def write_report(self, fname):
         """
+        Open report file for writing, suites and cases are written as soon as they're added.
+        Data goes into temporary file which replaces target one when everything is written.
+
         :type fname: str
         """
+        full_path = get_full_path(fname)
+        tmp_path = full_path + ".tmp"
         try:
-            if os.path.exists(fname):
-                self.log.warning("File %s already exists, it will be overwritten", fname)
-            else:
-                dirname = os.path.dirname(fname)
-                if dirname and not os.path.exists(dirname):
-                    os.makedirs(dirname)
-
-            testsuites = etree.Element("testsuites")
-            for _, suite in iteritems(self.test_suites):
-                testsuites.append(suite)
-            etree_obj = etree.ElementTree(testsuites)
-
-            self.log.info("Writing JUnit XML report into: %s", fname)
-            with open(get_full_path(fname), 'wb') as _fds:
-                etree_obj.write(_fds, xml_declaration=True, encoding="UTF-8", pretty_print=True)
-        except BaseException:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            fds = open(tmp_path, 'wb')
+        except EnvironmentError:
             raise TaurusInternalException("Cannot create file %s" % fname)
 
+        self.log.info("Writing JUnit XML report into: %s", fname)
+        try:
+            with fds, etree.xmlfile(fds, encoding="UTF-8") as xml_file:
+                xml_file.write_declaration()
+                with xml_file.element("testsuites"):
+                    self.xml_file = xml_file
+                    try:
+                        yield self
+                    except BaseException:
+                        self.suite.close()  # keep element nesting consistent for lxml
+                        raise
+                    self.__close_suite()
+                    self.__indent(0)
+            os.replace(tmp_path, full_path)
+        except BaseException as exc:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if isinstance(exc, (EnvironmentError, etree.LxmlError)):
+                raise TaurusInternalException("Cannot create file %s: %s" % (fname, exc))
+            raise
+        finally:
+            self.xml_file = None
+
     def report_test_suite(self, suite_name):
         """
         :type suite_name: str
-        :type children: list[bzt.six.etree.Element]
         """
-        self.add_test_suite(suite_name, attributes={"name": suite_name, "package_name": "bzt"})
+        self.add_test_suite(attributes={"name": suite_name, "package_name": "bzt"})
 
-    def report_test_case(self, suite_name, case_name, children=None):
+    @contextmanager
+    def report_test_case(self, case_name):
         """
-        :type suite_name: str
         :type case_name: str
-        :type children: list[bzt.six.etree.Element]
         """
-        children = children or []
-        if self.report_urls:
-            system_out = etree.Element("system-out")
-            system_out.text = "".join(self.report_urls)
-            children.insert(0, system_out)
-        self.add_test_case(suite_name, attributes={"classname": self.class_name, "name": case_name}, children=children)
-
-    def add_test_suite(self, suite_name, attributes=None, children=()):
-        attributes = attributes or {}
-
-        suite = etree.Element("testsuite", **attributes)
-
+        with self.add_test_case(attributes={"classname": self.class_name, "name": case_name}) as test_case:
+            if self.system_out:
+                system_out = etree.SubElement(test_case, "system-out")
+                system_out.text = self.system_out
+            yield test_case
+
+    def add_test_suite(self, attributes=None, children=()):
+        self.__close_suite()
+        self.__indent(1)
+        self.suite.enter_context(self.xml_file.element("testsuite", attributes or {}))
         for child in children:
-            suite.append(child)
+            self.__write(child, level=2)
 
-        if not suite_name in self.test_suites:
-            self.test_suites[suite_name] = suite
-
-    def add_test_case(self, suite_name, attributes=None, children=()):
+    @contextmanager
+    def add_test_case(self, attributes=None):
+        """
+        Yields testcase element to fill with children, element is written when block ends
+        """
         attributes = attributes or {}
 
-        case = etree.Element("testcase", **attributes)
-
-        for child in children:
-            case.append(child)
-
-        self.test_suites[suite_name].append(case)
+        test_case = etree.Element("testcase", **attributes)
+        yield test_case
+        self.__write(test_case, level=2)
+
+    def __write(self, element, level):
+        if self.pretty_print:
+            etree.indent(element, level=level)
+        self.__indent(level)
+        self.xml_file.write(element)
+        self.suite_is_empty = False
+
+    def __close_suite(self):
+        if not self.suite_is_empty:
+            self.__indent(1)
+            self.suite_is_empty = True
+        self.suite.close()
+
+    def __indent(self, level):
+        if self.pretty_print:
+            self.xml_file.write("\n" + "  " * level)
@@ -1,4 +1,6 @@
+import logging
 import unittest
+import unittest.mock as mock
 import os
 import time
 from collections import Counter
@@ -91,6 +93,28 @@ class TestFinalStatusReporter(BZTestCase):
                          )
         self.assertEqual(target_output, self.log_recorder.info_buff.getvalue())
 
+    def test_log_messages_info_disabled(self):
+        obj = FinalStatus()
+        obj.engine = EngineEmul()
+        obj.parameters = BetterDict.from_dict({"failed-labels": True, "percentiles": True, "summary": False,
+                                               "test-duration": False, "summary-labels": True})
+        self.sniff_log(obj.log)
+        self.addCleanup(obj.log.setLevel, obj.log.level)
+        obj.log.setLevel(logging.WARNING)
+
+        obj.startup()
+        obj.shutdown()
+        obj.aggregated_second(self.__get_datapoint())
+        with mock.patch('bzt.modules.reporting.sorted', create=True) as sorted_mock, \
+                mock.patch('bzt.modules.reporting.AsciiTable') as ascii_table, \
+                mock.patch('bzt.modules.reporting.SingleTable') as single_table:
+            obj.post_process()
+
+        sorted_mock.assert_not_called()
+        ascii_table.assert_not_called()
+        single_table.assert_not_called()
+        self.assertEqual("", self.log_recorder.info_buff.getvalue())
+
     def test_log_messages_samples_count(self):
         obj = FinalStatus()
         obj.engine = EngineEmul()
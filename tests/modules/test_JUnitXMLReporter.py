@@ -1,5 +1,6 @@
 import os
 import tempfile
+import unittest.mock as mock
 from collections import Counter
 
 from bzt.modules import FuncSamplesReader
@@ -7,7 +8,8 @@ from bzt.modules import FunctionalAggregator
 from bzt.modules.aggregator import DataPoint, KPISet
 from bzt.modules.blazemeter import BlazeMeterUploader, CloudProvisioning
 from bzt.modules.passfail import PassFailStatus, DataCriterion, CriteriaProcessor
-from bzt.modules.reporting import JUnitXMLReporter
+from bzt import TaurusInternalException
+from bzt.modules.reporting import JUnitXMLReporter, XUnitFileWriter
 from bzt.six import etree
 from bzt.utils import BetterDict
 from tests import BZTestCase, RESOURCES_DIR, ROOT_LOGGER
@@ -91,6 +93,60 @@ class TestJUnitXML(BZTestCase):
 
         self.assertTrue(os.path.exists(obj.report_file_path))
 
+    def test_overwrite_existing_report(self):
+        obj = JUnitXMLReporter()
+        obj.engine = EngineEmul()
+        path_from_config = obj.engine.create_artifact("junit-xml-overwrite", ".xml")
+        with open(path_from_config, 'w') as fds:
+            fds.write("old content")
+        obj.parameters = BetterDict.from_dict({"filename": path_from_config, "data-source": "pass-fail"})
+
+        obj.prepare()
+        obj.last_second = DataPoint(0)
+        obj.post_process()
+
+        with open(obj.report_file_path, 'rb') as fds:
+            xml_tree = etree.fromstring(fds.read())
+        self.assertEqual('testsuites', xml_tree.tag)
+        self.assertFalse(os.path.exists(path_from_config + ".tmp"))
+
+    def test_processing_error_propagates(self):
+        engine = EngineEmul()
+        path = engine.create_artifact("junit-xml-processing-error", ".xml")
+        writer = XUnitFileWriter(engine)
+
+        with self.assertRaises(ValueError):
+            with writer.write_report(path):
+                writer.report_test_suite("suite")
+                raise ValueError("processing failed")
+
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+    def test_write_error(self):
+        engine = EngineEmul()
+        path = engine.create_artifact("junit-xml-write-error", ".xml")
+        writer = XUnitFileWriter(engine)
+
+        with mock.patch('bzt.modules.reporting.os.replace', side_effect=OSError("disk full")):
+            with self.assertRaises(TaurusInternalException):
+                with writer.write_report(path):
+                    writer.report_test_suite("suite")
+
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+    def test_no_sample_labels_data(self):
+        obj = JUnitXMLReporter()
+        obj.engine = EngineEmul()
+        path_from_config = tempfile.mktemp(suffix='.xml', prefix='junit-xml-no-data', dir=obj.engine.artifacts_dir)
+        obj.parameters = BetterDict.from_dict({"filename": path_from_config, "data-source": "sample-labels"})
+
+        obj.prepare()
+        obj.aggregated_second(DataPoint(0, []))
+        obj.post_process()
+
+        self.assertFalse(os.path.exists(obj.report_file_path))
+
     def test_xml_format_sample_labels(self):
         # generate xml, compare hash
 
@@ -319,11 +375,13 @@ class TestJUnitXML(BZTestCase):
         obj.parameters = BetterDict()
 
         pass_fail = PassFailStatus()
+        processor = CriteriaProcessor([], None)
+        pass_fail.processors.append(processor)
 
         crit_cfg = BetterDict.from_dict({'stop': True, 'fail': True, 'timeframe': -1, 'threshold': '150ms',
                                          'condition': '<', 'subject': 'avg-rt'})
-        criteria = DataCriterion(crit_cfg, pass_fail)
-        pass_fail.criteria.append(criteria)
+        criteria = DataCriterion(crit_cfg, processor)
+        processor.criteria.append(criteria)
         criteria.is_triggered = True
 
         obj.engine.reporters.append(pass_fail)
@@ -334,6 +392,11 @@ class TestJUnitXML(BZTestCase):
         obj.last_second = DataPoint(0)
         obj.post_process()
 
+        with open(obj.report_file_path, 'rb') as fds:
+            xml_tree = etree.fromstring(fds.read())
+        test_case = xml_tree.find("testsuite/testcase")
+        self.assertEqual("avg-rt<150ms for -1", test_case.get("name"))
+
     def test_functional_report(self):
         engine = EngineEmul()
         aggregator = FunctionalAggregator()
@@ -343,7 +406,7 @@ class TestJUnitXML(BZTestCase):
 
         obj = JUnitXMLReporter()
         obj.engine = engine
-        obj.parameters = BetterDict()
+        obj.parameters = BetterDict.from_dict({"pretty-print": True})
 
         reader = FuncSamplesReader(RESOURCES_DIR + "functional/apiritif.ldjson", engine, ROOT_LOGGER)
         aggregator.add_underling(reader)